@@ -1,44 +1,70 @@
-import os
-from datetime import datetime, timedelta
-from typing import TypedDict, Annotated, Sequence, Optional
-
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+import json
+import time
+import functools
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Literal
+
+from langchain_core.messages import SystemMessage
 from langchain_core.tools import tool
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from langgraph.types import CachePolicy
+from langgraph.cache.base import BaseCache
+from pydantic import BaseModel
+
 from googleapiclient.errors import HttpError
 
+from agent_factory import build_agent, as_tool
+from google_service import GoogleService
+
 # --- 1. CONFIGURATION AND AUTHENTICATION ---
 
 # This scope allows for reading, creating, updating, and deleting events.
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 TOKEN_FILE = "token_calendar.json"
-CREDENTIALS_FILE = "client_secret.json"
 LOCAL_TIMEZONE = "Asia/Kolkata" 
 
-def get_calendar_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
-    return build("calendar", "v3", credentials=creds)
+CALENDAR = GoogleService("calendar", "v3", SCOPES, TOKEN_FILE)
 
 # --- 2. DEFINE CALENDAR TOOLS ---
 
+# Google accepts at most 50 sub-requests in one batch call.
+MAX_BATCH_SIZE = 50
+
+def _event_delta(summary=None, start_time=None, end_time=None):
+    """Builds a PATCH body containing only the fields that are being changed."""
+    body = {}
+    if summary: body['summary'] = summary
+    # Times are interpreted in the same zone create_calendar_event uses.
+    if start_time: body['start'] = {'dateTime': start_time, 'timeZone': LOCAL_TIMEZONE}
+    if end_time: body['end'] = {'dateTime': end_time, 'timeZone': LOCAL_TIMEZONE}
+    return body
+
+class CalendarOp(BaseModel):
+    """A single update or delete to apply to an existing event."""
+    action: Literal["update", "delete"]
+    event_id: str
+    summary: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+
+@functools.lru_cache(maxsize=32)
+def _day_bounds(target_date):
+    """Returns the (timeMin, timeMax) RFC 3339 strings covering `target_date` in UTC."""
+    start = datetime.combine(target_date, datetime.min.time(), tzinfo=timezone.utc)
+    end = datetime.combine(target_date, datetime.max.time(), tzinfo=timezone.utc)
+    return (
+        start.isoformat(timespec='seconds').replace('+00:00', 'Z'),
+        end.isoformat(timespec='seconds').replace('+00:00', 'Z'),
+    )
+
+def _to_event(event):
+    start = event['start']
+    return {"id": event['id'], "summary": event['summary'], "start": start.get('dateTime') or start.get('date')}
+
+# Results of get_calendar_events are reused for a short while; every write below clears them.
+EVENTS_CACHE_TTL = 30
+_events_cache = {}
+
 @tool
 def get_calendar_events(day: Optional[str] = "today"):
     """
@@ -46,48 +72,63 @@ def get_calendar_events(day: Optional[str] = "today"):
     Args:
         day (str, optional): The day to get events for. Can be "today", "tomorrow", or a date in "YYYY-MM-DD" format. Defaults to "today".
     """
-    service = get_calendar_service()
+    today_utc = datetime.now(timezone.utc).date()
+    cache_key = ((day or "today").lower(), today_utc)
+    cached = _events_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < EVENTS_CACHE_TTL:
+        return cached[1]
+
     try:
-        now_utc = datetime.utcnow()
         if day is None or day.lower() == 'today':
-            target_date = now_utc.date()
+            target_date = today_utc
         elif day.lower() == 'tomorrow':
-            target_date = now_utc.date() + timedelta(days=1)
+            target_date = today_utc + timedelta(days=1)
         else:
+            # strptime also accepts unpadded dates like 2026-1-5, which fromisoformat rejects.
             target_date = datetime.strptime(day, "%Y-%m-%d").date()
 
-        start_of_day_utc = datetime.combine(target_date, datetime.min.time())
-        end_of_day_utc = datetime.combine(target_date, datetime.max.time())
-        
-        start_time_iso = start_of_day_utc.isoformat() + "Z"
-        end_time_iso = end_of_day_utc.isoformat() + "Z"
+        start_time_iso, end_time_iso = _day_bounds(target_date)
 
-        events_result = service.events().list(
+        events_result = CALENDAR.execute(lambda service: service.events().list(
             calendarId='primary', timeMin=start_time_iso, timeMax=end_time_iso,
-            maxResults=20, singleEvents=True, orderBy='startTime'
-        ).execute()
+            maxResults=20, singleEvents=True, orderBy='startTime',
+            # Partial response: only the fields returned to the model below.
+            fields="items(id,summary,start/dateTime,start/date)"
+        ))
         events = events_result.get('items', [])
 
         if not events:
-            return f"No upcoming events found for {day}."
-
-        return [{"id": event['id'], "summary": event['summary'], "start": event['start'].get('dateTime', event['start'].get('date'))} for event in events]
+            result = f"No upcoming events found for {day}."
+        else:
+            result = list(map(_to_event, events))
     except Exception as e:
         return f"An error occurred: {e}"
 
+    now = time.monotonic()
+    # Entries expire but are otherwise never read again once their day has passed, so drop them here.
+    for key, (cached_at, _) in list(_events_cache.items()):
+        if now - cached_at >= EVENTS_CACHE_TTL:
+            _events_cache.pop(key, None)
+    _events_cache[cache_key] = (now, result)
+    return result
+
 @tool
 def create_calendar_event(summary: str, start_time: str, end_time: str, description: Optional[str] = None, attendees: Optional[list[str]] = None):
     """Creates a new event on the primary Google Calendar."""
-    service = get_calendar_service()
     event = {
         'summary': summary,
-        'description': description,
         'start': {'dateTime': start_time, 'timeZone': LOCAL_TIMEZONE},
         'end': {'dateTime': end_time, 'timeZone': LOCAL_TIMEZONE},
-        'attendees': [{'email': email} for email in attendees] if attendees else [],
     }
+    if description:
+        event['description'] = description
+    if attendees:
+        event['attendees'] = [{'email': email} for email in attendees]
+    # Invitation emails are only needed when someone else is on the event.
+    send_updates = "all" if attendees else "none"
     try:
-        created_event = service.events().insert(calendarId='primary', body=event, sendUpdates="all").execute()
+        created_event = CALENDAR.execute(lambda service: service.events().insert(calendarId='primary', body=event, sendUpdates=send_updates))
+        _events_cache.clear()
         return f"Event created successfully. Summary: '{summary}'. Link: {created_event.get('htmlLink')}"
     except HttpError as error:
         return f"An error occurred: {error}"
@@ -95,14 +136,11 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, descript
 @tool
 def update_calendar_event(event_id: str, summary: Optional[str] = None, start_time: Optional[str] = None, end_time: Optional[str] = None):
     """Updates an existing calendar event by its ID."""
-    service = get_calendar_service()
     try:
-        event = service.events().get(calendarId='primary', eventId=event_id).execute()
-        if summary: event['summary'] = summary
-        if start_time: event['start']['dateTime'] = start_time
-        if end_time: event['end']['dateTime'] = end_time
-        
-        updated_event = service.events().update(calendarId='primary', eventId=event['id'], body=event).execute()
+        # A single PATCH with only the changed fields; the server merges it into the stored event.
+        body = _event_delta(summary, start_time, end_time)
+        updated_event = CALENDAR.execute(lambda service: service.events().patch(calendarId='primary', eventId=event_id, body=body, sendUpdates='none'))
+        _events_cache.clear()
         return f"Event updated successfully. Link: {updated_event.get('htmlLink')}"
     except HttpError as error:
         return f"An error occurred: {error}"
@@ -110,23 +148,116 @@ def update_calendar_event(event_id: str, summary: Optional[str] = None, start_ti
 @tool
 def delete_calendar_event(event_id: str):
     """Deletes a calendar event by its ID."""
-    service = get_calendar_service()
     try:
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
+        CALENDAR.execute(lambda service: service.events().delete(calendarId='primary', eventId=event_id))
+        _events_cache.clear()
         return f"Event with ID {event_id} deleted successfully."
     except HttpError as error:
         return f"An error occurred: {error}"
 
+@tool
+def batch_calendar_ops(ops: list[CalendarOp]):
+    """Updates or deletes several calendar events by their IDs in one batched request."""
+    results = []
+
+    def callback(request_id, response, exception):
+        op = ops[int(request_id)]
+        if exception is not None:
+            results.append(f"Failed to {op.action} event {op.event_id}: {exception}")
+        else:
+            results.append(f"Event {op.event_id} {op.action}d successfully.")
+
+    def make_batch(service, start):
+        # Clear partial results in case CALENDAR.execute retries the whole batch.
+        del results[start:]
+        batch = service.new_batch_http_request(callback=callback)
+        for i in range(start, min(start + MAX_BATCH_SIZE, len(ops))):
+            op = ops[i]
+            if op.action == "delete":
+                request = service.events().delete(calendarId='primary', eventId=op.event_id)
+            else:
+                body = _event_delta(op.summary, op.start_time, op.end_time)
+                request = service.events().patch(calendarId='primary', eventId=op.event_id, body=body, sendUpdates='none')
+            batch.add(request, request_id=str(i))
+        return batch
+
+    try:
+        for start in range(0, len(ops), MAX_BATCH_SIZE):
+            CALENDAR.execute(lambda service: make_batch(service, start))
+        _events_cache.clear()
+        return results
+    except HttpError as error:
+        return f"An error occurred: {error}"
+
 # --- 3. SETUP THE AGENT WORKFLOW ---
 
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], lambda x, y: x + y]
+tools = [get_calendar_events, create_calendar_event, update_calendar_event, delete_calendar_event, batch_calendar_ops]
+
+# Repeated questions ("what's on my calendar today?") reuse the model's previous answer.
+MODEL_CACHE_TTL = 60
+MODEL_CACHE_SIZE = 256
+
+class _BoundedCache(BaseCache):
+    """In-memory node cache holding at most MODEL_CACHE_SIZE entries; expired ones are dropped on every write."""
+
+    def __init__(self):
+        super().__init__()
+        self._entries = {}  # full key -> (serialized value, expiry); oldest write first
+        self._lock = threading.Lock()
+
+    def get(self, keys):
+        now = time.monotonic()
+        values = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and (entry[1] is None or now < entry[1]):
+                    values[key] = self.serde.loads_typed(entry[0])
+        return values
+
+    async def aget(self, keys):
+        return self.get(keys)
+
+    def set(self, pairs):
+        now = time.monotonic()
+        with self._lock:
+            for key, (value, ttl) in pairs.items():
+                # Re-inserting moves an overwritten key to the newest position.
+                self._entries.pop(key, None)
+                self._entries[key] = (self.serde.dumps_typed(value), None if ttl is None else now + ttl)
+            for key, (_, expiry) in list(self._entries.items()):
+                if expiry is not None and expiry <= now:
+                    del self._entries[key]
+            for key in list(self._entries)[:-MODEL_CACHE_SIZE]:
+                del self._entries[key]
+
+    async def aset(self, pairs):
+        self.set(pairs)
+
+    def clear(self, namespaces=None):
+        with self._lock:
+            if namespaces is None:
+                self._entries.clear()
+            else:
+                namespaces = {tuple(ns) for ns in namespaces}
+                for key in [k for k in self._entries if tuple(k[0]) in namespaces]:
+                    del self._entries[key]
+
+    async def aclear(self, namespaces=None):
+        self.clear(namespaces)
+
+def _model_cache_key(state):
+    """Keys the model node on what the model sees; message and tool-call IDs change on every run."""
+    parts = [datetime.now().strftime('%Y-%m-%d')]
+    for message in state["messages"]:
+        parts.append(f"{message.type}:{message.content}")
+        for call in getattr(message, "tool_calls", None) or []:
+            parts.append(json.dumps([call["name"], call["args"]], sort_keys=True, default=str))
+    return "\x1f".join(parts)
 
 def create_calendar_agent_app():
-    tools = [get_calendar_events, create_calendar_event, update_calendar_event, delete_calendar_event]
-    tool_node = ToolNode(tools)
     
-    SYSTEM_PROMPT = f"""
+    SYSTEM_PROMPT = """
 # 📅 Overview
 You are a **calendar assistant**. Your responsibilities include creating, retrieving, updating, and deleting events in the user's calendar.
 
@@ -143,7 +274,7 @@ Use this tool to create calendar events — solo or with participants.
 - If the user doesn’t specify duration, default to **1 hour**.
 - If time isn’t mentioned, ask the user for clarification before creating.
 
-**Examples:**
+**Example:**
 - User: “Schedule a meeting with Priya tomorrow at 3 PM.”
   → Action: `Create Event` with:
     - Title: “Meeting with Priya”
@@ -152,14 +283,6 @@ Use this tool to create calendar events — solo or with participants.
     - Duration: 1 hour
     - Participants: Priya
 
-- User: “Block some time for focused work on Thursday afternoon.”
-  → Action: `Create Event` with:
-    - Title: “Focus time”
-    - Date: Upcoming Thursday
-    - Time: 2 PM (default)
-    - Duration: 1 hour
-    - Participants: None
-
 ---
 
 ### 📂 Get Events
@@ -172,9 +295,6 @@ Use this to retrieve the user’s upcoming events, daily schedule, or specific e
 - User: “Do I have any meetings next week?”
   → Action: `Get Events` from next Monday to Sunday.
 
-- User: “List all events with Ankit this month.”
-  → Action: `Get Events` with filter by participant “Ankit”.
-
 ---
 
 ### 🗑️ Delete Event
@@ -183,16 +303,11 @@ Use this to delete a calendar event.
 **Important:**
 You must first use `Get Events` to find the **event ID**.
 
-**Examples:**
+**Example:**
 - User: “Cancel my 1-on-1 with Shashank on Friday.”
   → Step 1: `Get Events` to find matching event.
   → Step 2: `Delete Event` using the event ID.
 
-- User: “Delete the focus session I added for Wednesday.”
-  → Step 1: Get the event list for Wednesday.
-  → Step 2: Identify the focus session.
-  → Step 3: `Delete Event` with event ID.
-
 ---
 
 ### ✏️ Update Event
@@ -200,49 +315,42 @@ Use this to modify an existing event’s details — time, date, duration, title
 
 **Important:** Use `Get Events` first to retrieve the event and its ID.
 
-**Examples:**
+**Example:**
 - User: “Reschedule my call with Alex from 4 PM to 5 PM.”
   → Step 1: `Get Events` to find the call with Alex.
   → Step 2: `Update Event` with new time = 5 PM.
 
-- User: “Change tomorrow’s design review to 90 minutes.”
+---
+
+### 📦 Batch Update / Delete
+Use this when several existing events need to be updated or deleted at once. All changes are sent in a single request.
+
+**Important:** Use `Get Events` first to collect the event IDs.
+
+**Example:**
+- User: “Cancel all my meetings tomorrow.”
   → Step 1: Get tomorrow’s events.
-  → Step 2: Identify “Design review”.
-  → Step 3: Update duration to 90 minutes.
+  → Step 2: `Batch Update / Delete` with a `delete` op for each event ID.
 
 ---
 
 ## 🕒 Final Notes
-- Assume event duration is **1 hour** if not specified.
 - If a participant is mentioned, include them in the invite.
-- Be proactive: if details are missing (date/time), ask for clarification before proceeding.
-- Respect the current date/time: **{datetime.now().strftime('%Y-%m-%d')}**
+- Respect the current date/time given below.
 
 """
     
-    model = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro-latest",
-        google_api_key=os.environ["GEMINI_API_KEY"],
-    ).bind(functions=[convert_to_openai_function(t) for t in tools])
-
-    def call_model(state):
-        response = model.invoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])
-        return {"messages": [response]}
-
-    def should_continue(state):
-        return "function_call" in state["messages"][-1].additional_kwargs
-
-    workflow = StateGraph(AgentState)
-    workflow.add_node("agent", call_model)
-    workflow.add_node("action", tool_node)
-    workflow.set_entry_point("agent")
-    workflow.add_conditional_edges("agent", should_continue, {True: "action", False: END})
-    workflow.add_edge("action", "agent")
-    return workflow.compile()
-
-@tool
-def run_calendar_agent(query: str) -> str:
-    """Use this tool to manage calendar events (get, create, update, delete)."""
-    app = create_calendar_agent_app()
-    result = app.invoke({"messages": [HumanMessage(content=query)]})
-    return result['messages'][-1].content
+    def build_messages(state):
+        # The date is sent per call so the compiled app can be reused across days.
+        today = SystemMessage(content=f"Today's date is {datetime.now().strftime('%Y-%m-%d')}.")
+        return [SystemMessage(content=SYSTEM_PROMPT), today] + state["messages"]
+
+    return build_agent(
+        "agent", tools, build_messages=build_messages,
+        cache_policy=CachePolicy(key_func=_model_cache_key, ttl=MODEL_CACHE_TTL), cache=_BoundedCache(),
+    )
+
+run_calendar_agent = as_tool(
+    create_calendar_agent_app(), "run_calendar_agent",
+    "Use this tool to manage calendar events (get, create, update, delete).",
+)
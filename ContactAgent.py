@@ -1,62 +1,174 @@
 import os
-from typing import TypedDict, Annotated, Sequence, Optional
+import pickle
+import functools
+import threading
+from typing import Optional
 
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+
 from googleapiclient.errors import HttpError
 
+from agent_factory import build_agent, as_tool
+from google_service import GoogleService
+
 # Scope allows for reading and writing contacts
 SCOPES = ["https://www.googleapis.com/auth/contacts"]
 TOKEN_FILE = "token_people.json"
-CREDENTIALS_FILE = "client_secret.json"
-
-def get_people_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+
+PEOPLE = GoogleService("people", "v1", SCOPES, TOKEN_FILE)
+
+PERSON_FIELDS = "names,phoneNumbers,emailAddresses"
+
+def _to_contact(person):
+    name = person.get("names", [{}])[0].get("displayName", "N/A")
+    phones = [p.get("value") for p in person.get("phoneNumbers", [])]
+    emails = [e.get("value") for e in person.get("emailAddresses", [])]
+    return {"name": name, "phones": phones, "emails": emails}
+
+@functools.lru_cache(maxsize=1)
+def _warm_up_search():
+    # searchContacts answers from a server-side cache that must be primed once with an empty query.
+    return PEOPLE.execute(lambda service: service.people().searchContacts(query="", readMask="names"))
+
+def _search_contacts(query):
+    _warm_up_search()
+    response = PEOPLE.execute(lambda service: service.people().searchContacts(
+        query=query, readMask=PERSON_FIELDS, pageSize=30,
+        fields="results(person(names/displayName,phoneNumbers/value,emailAddresses/value))"
+    ))
+    return [_to_contact(result["person"]) for result in response.get("results", [])]
+
+# The full connection list is cached in-process and on disk, and kept current with incremental
+# syncs so each lookup only transfers the contacts that changed since the previous one. Each
+# signed-in account gets its own cache file.
+CONTACT_CACHE_DIR = os.path.expanduser("~/.cache")
+_contact_cache = None
+_CONTACT_CACHE_LOCK = threading.Lock()
+
+# Lookups go through a trigram index of display names that is rebuilt only when a sync changes the cache.
+_contact_index = None
+
+def _list_connections(**params):
+    """Pages through connections().list and returns (people, next_sync_token)."""
+    people, page_token = [], None
+    while True:
+        response = PEOPLE.execute(lambda service: service.people().connections().list(
+            resourceName="people/me", pageSize=1000, personFields=PERSON_FIELDS + ",metadata",
+            pageToken=page_token, **params,
+            # Partial response: only the fields read below, plus what incremental sync needs.
+            fields="connections(resourceName,metadata/deleted,names/displayName,phoneNumbers/value,emailAddresses/value),"
+                   "nextPageToken,nextSyncToken"
+        ))
+        people.extend(response.get("connections", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return people, response.get("nextSyncToken")
+
+@functools.lru_cache(maxsize=1)
+def _account_id(creds):
+    """Returns the signed-in account's People ID; keyed on the credentials so a new sign-in looks it up again."""
+    me = PEOPLE.execute(lambda service: service.people().get(
+        resourceName="people/me", personFields="metadata", fields="resourceName"
+    ))
+    return me["resourceName"].rsplit("/", 1)[-1]
+
+def _contact_cache_file(account):
+    return os.path.join(CONTACT_CACHE_DIR, f"contact_agent_{account}.pkl")
+
+def _save_contact_cache(cache):
+    cache_file_name = _contact_cache_file(cache["account"])
+    os.makedirs(CONTACT_CACHE_DIR, exist_ok=True)
+    tmp_file = cache_file_name + ".tmp"
+    with open(tmp_file, "wb") as cache_file:
+        pickle.dump(cache, cache_file)
+    os.replace(tmp_file, cache_file_name)
+
+def _sync_connections():
+    """Brings the cached connections up to date with the changes since the last sync."""
+    global _contact_cache, _contact_index
+    account = _account_id(PEOPLE.credentials())
+    if _contact_cache is not None and _contact_cache["account"] != account:
+        _contact_cache = _contact_index = None
+    if _contact_cache is None and os.path.exists(_contact_cache_file(account)):
+        with open(_contact_cache_file(account), "rb") as cache_file:
+            _contact_cache = pickle.load(cache_file)
+        _contact_index = None
+
+    if _contact_cache is not None and not _contact_cache["sync_token"]:
+        _contact_cache = None
+    if _contact_cache is not None:
+        try:
+            # Every parameter of a syncToken call must match the call that issued the token.
+            changed, sync_token = _list_connections(requestSyncToken=True, syncToken=_contact_cache["sync_token"])
+        except HttpError as error:
+            if error.resp.status not in (400, 410):
+                raise
+            # The sync token was rejected (they expire after a week); fall back to a full sync.
+            _contact_cache = None
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token_file:
-            token_file.write(creds.to_json())
-    return build("people", "v1", credentials=creds)
+            if not sync_token:
+                _contact_cache = None
+
+    if _contact_cache is None:
+        people, sync_token = _list_connections(requestSyncToken=True)
+        _contact_cache = {"account": account, "connections": {p["resourceName"]: p for p in people}, "sync_token": sync_token}
+        # Without a sync token the next lookup syncs fully again, so there's nothing worth persisting.
+        if sync_token:
+            _save_contact_cache(_contact_cache)
+        _contact_index = None
+    elif changed or sync_token != _contact_cache["sync_token"]:
+        connections = _contact_cache["connections"]
+        for person in changed:
+            if person.get("metadata", {}).get("deleted"):
+                connections.pop(person["resourceName"], None)
+            else:
+                connections[person["resourceName"]] = person
+        _contact_cache["sync_token"] = sync_token
+        _save_contact_cache(_contact_cache)
+        if changed:
+            _contact_index = None
+
+def _display_names(person):
+    return [n.get("displayName", "").lower() for n in person.get("names", [])]
+
+def _build_index(people):
+    """Maps every 3-character shingle of a lowercased display name to the positions of the people carrying it."""
+    index = {}
+    for i, person in enumerate(people):
+        for name in _display_names(person):
+            for j in range(len(name) - 2):
+                index.setdefault(name[j:j + 3], set()).add(i)
+    return index
+
+def _lookup_connections(query):
+    global _contact_index
+    with _CONTACT_CACHE_LOCK:
+        _sync_connections()
+        if _contact_index is None:
+            people = list(_contact_cache["connections"].values())
+            _contact_index = (people, _build_index(people))
+        people, index = _contact_index
+
+    lower_query = query.lower()
+    if len(lower_query) >= 3:
+        # Every name containing the query contains all of its shingles; intersect starting from the rarest.
+        postings = sorted((index.get(lower_query[i:i + 3], set()) for i in range(len(lower_query) - 2)), key=len)
+        candidates = sorted(postings[0].intersection(*postings[1:]))
+    else:
+        candidates = range(len(people))
+    return [
+        _to_contact(people[i]) for i in candidates
+        if any(lower_query in name for name in _display_names(people[i]))
+    ]
 
 @tool
 def get_contacts(query: str) -> list:
     """Searches for contacts by name to find their email or phone number."""
-    service = get_people_service()
     try:
-        connections = service.people().connections().list(
-            resourceName="people/me", pageSize=1000, personFields="names,phoneNumbers,emailAddresses"
-        ).execute()
-        
-        all_contacts = connections.get("connections", [])
-        found_contacts = []
-        lower_query = query.lower()
-        
-        for person in all_contacts:
-            match = False
-            if any(lower_query in n.get("displayName", "").lower() for n in person.get("names", [])):
-                match = True
-            
-            if match:
-                name = person.get("names", [{}])[0].get("displayName", "N/A")
-                phones = [p.get("value") for p in person.get("phoneNumbers", [])]
-                emails = [e.get("value") for e in person.get("emailAddresses", [])]
-                found_contacts.append({"name": name, "phones": phones, "emails": emails})
-
+        found_contacts = _search_contacts(query)
+        if not found_contacts:
+            # The server index only matches word prefixes; keep substring matches like "ank" -> "Shashank".
+            found_contacts = _lookup_connections(query)
         return found_contacts if found_contacts else "No contacts found matching that query."
     except HttpError as e:
         return f"An error occurred: {e}"
@@ -64,7 +176,6 @@ def get_contacts(query: str) -> list:
 @tool
 def add_or_update_contact(name: str, phone: Optional[str] = None, email: Optional[str] = None):
     """Creates a new contact or updates an existing one with a phone number or email."""
-    service = get_people_service()
     try:
         # This is a simplified creation logic. A full implementation would search and update.
         new_contact = {
@@ -72,18 +183,14 @@ def add_or_update_contact(name: str, phone: Optional[str] = None, email: Optiona
             "phoneNumbers": [{"value": phone}] if phone else [],
             "emailAddresses": [{"value": email}] if email else [],
         }
-        created_person = service.people().createContact(body=new_contact).execute()
+        created_person = PEOPLE.execute(lambda service: service.people().createContact(body=new_contact))
         return f"Successfully created/updated contact: {created_person.get('names')[0].get('displayName')}"
     except HttpError as e:
         return f"An error occurred: {e}"
 
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], lambda x, y: x + y]
+tools = [get_contacts, add_or_update_contact]
 
 def create_contact_agent_app():
-    # Ensure both tools are available to the agent
-    tools = [get_contacts, add_or_update_contact]
-    tool_node = ToolNode(tools)
     
     # --- THIS IS THE ENHANCED PROMPT ---
     SYSTEM_PROMPT = """
@@ -98,12 +205,6 @@ def create_contact_agent_app():
 ## 🧾 `get_contacts` Examples:
 
 ### ✅ When contact is found:
-- **Tool Output:** `[{'name': 'Shashank Heroor', 'phones': [], 'emails': ['shashankheroor2@gmail.com']}]`
-- **Your Final Summary:** `Contact found for Shashank Heroor. Email: shashankheroor2@gmail.com`
-
-- **Tool Output:** `[{'name': 'Ananya Singh', 'phones': ['+918888888888'], 'emails': []}]`
-- **Summary:** `Contact found for Ananya Singh. Phone: +918888888888`
-
 - **Tool Output:** `[{'name': 'Rahul Verma', 'phones': ['+911234567890'], 'emails': ['rahul@example.com']}]`
 - **Summary:** `Contact found for Rahul Verma. Phone: +911234567890. Email: rahul@example.com`
 
@@ -123,41 +224,17 @@ def create_contact_agent_app():
 - **Tool Output:** `'Successfully created/updated contact: Kiran Rao'`
 - **Your Final Summary:** `Successfully updated contact for Kiran Rao.`
 
-### ⚠️ If the contact name already exists but fields are new:
-- **Tool Output:** `'Successfully created/updated contact: Dr. Meera Patel'`
-- **Your Final Summary:** `Successfully updated contact for Dr. Meera Patel.`
-
 ---
 
 ✅ Keep your response short and exact.  
 ✅ Always mention the contact name in the final summary.  
-✅ If phone and email are both available, include both.  
+✅ Include whichever of phone and email are available.  
 ✅ If neither is available in `get_contacts`, still return: `Contact found for [name].`
 """
-    
-    model = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro-latest",
-        google_api_key=os.environ["GEMINI_API_KEY"],
-    ).bind(functions=[convert_to_openai_function(t) for t in tools])
-
-    def call_model(state):
-        response = model.invoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])
-        return {"messages": [response]}
-
-    def should_continue(state):
-        return "function_call" in state["messages"][-1].additional_kwargs
-
-    workflow = StateGraph(AgentState)
-    workflow.add_node("agent", call_model)
-    workflow.add_node("action", tool_node)
-    workflow.set_entry_point("agent")
-    workflow.add_conditional_edges("agent", should_continue, {True: "action", False: END})
-    workflow.add_edge("action", "agent")
-    return workflow.compile()
 
-@tool
-def run_contact_agent(query: str) -> str:
-    """Use this tool to manage contacts (get, add, update)."""
-    app = create_contact_agent_app()
-    result = app.invoke({"messages": [HumanMessage(content=query)]})
-    return result['messages'][-1].content
+    return build_agent("agent", tools, SYSTEM_PROMPT)
+
+run_contact_agent = as_tool(
+    create_contact_agent_app(), "run_contact_agent",
+    "Use this tool to manage contacts (get, add, update).",
+)
@@ -1,14 +1,8 @@
 import os
 from dotenv import load_dotenv
-from typing import TypedDict, Annotated, Sequence
 
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_core.tools import tool
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_tavily import TavilySearch
+from agent_factory import build_agent, as_tool
+from tavily_client import pooled_tavily_search
 
 # --- THIS IS THE FIX ---
 # Load environment variables at the top of the file
@@ -18,15 +12,12 @@ load_dotenv()
 if not os.environ.get("TAVILY_API_KEY"):
     raise ValueError("TAVILY_API_KEY not found in .env file or environment variables.")
 
-web_search_tool = TavilySearch(max_results=5, name="tavily_search")
+web_search_tool = pooled_tavily_search(max_results=5, name="tavily_search")
 
 # --- 2. SETUP THE AGENT WORKFLOW ---
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], lambda x, y: x + y]
+tools = [web_search_tool]
 
 def create_content_agent_app():
-    tools = [web_search_tool]
-    tool_node = ToolNode(tools)
     SYSTEM_PROMPT = """
 # ✍️ Overview
 You are a **skilled AI blog writer**. Your writing style is clear, compelling, and informative. Your role is to generate well-researched blog posts using reliable sources.
@@ -79,36 +70,12 @@ You are a **skilled AI blog writer**. Your writing style is clear, compelling, a
 <h2>Challenges Ahead</h2>
 <p>Despite progress, infrastructure and affordability remain key challenges. However, with continued investment, India's EV future looks promising.</p>
 """
-    
-    model = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro-latest",
-        google_api_key=os.environ["GEMINI_API_KEY"],
-    ).bind(functions=[convert_to_openai_function(t) for t in tools])
-
-    def call_model(state):
-        response = model.invoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])
-        return {"messages": [response]}
-
-    def should_continue(state):
-        return "function_call" in state["messages"][-1].additional_kwargs
-
-    workflow = StateGraph(AgentState)
-    workflow.add_node("agent", call_model)
-    workflow.add_node("action", tool_node)
-    workflow.set_entry_point("agent")
-    workflow.add_conditional_edges("agent", should_continue, {True: "action", False: END})
-    workflow.add_edge("action", "agent")
-    return workflow.compile()
-
-@tool
-def run_content_creator_agent(query: str) -> str:
-    """Use this tool to create blog posts or other long-form content."""
-    app = create_content_agent_app()
-    final_result_html = ""
-    for event in app.stream({"messages": [HumanMessage(content=query)]}):
-        for value in event.values():
-            if isinstance(value['messages'][-1], HumanMessage):
-                continue
-            if not value['messages'][-1].additional_kwargs:
-                final_result_html = value['messages'][-1].content
-    return final_result_html
+
+    return build_agent("agent", tools, SYSTEM_PROMPT)
+
+run_content_creator_agent = as_tool(
+    create_content_agent_app(), "run_content_creator_agent",
+    "Use this tool to create blog posts or other long-form content.",
+    # Written content doesn't go stale like search results, so it's kept for a day.
+    cache_namespace="content", cache_ttl=24 * 60 * 60,
+)
@@ -1,62 +1,47 @@
-import os
-import base64
-from typing import TypedDict, Annotated, Sequence
-from datetime import datetime, timedelta
+import functools
 
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 
+try:
+    # SIMD-accelerated drop-in for the stdlib encoder, used when installed.
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+from agent_factory import build_agent, as_tool
+from google_service import GoogleService
+
 # --- 1. CONFIGURATION AND AUTHENTICATION ---
 
 # This scope allows for reading, composing, sending, and modifying labels.
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 TOKEN_FILE = "token_gmail.json"
-CREDENTIALS_FILE = "client_secret.json"
-
-def get_gmail_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
-    return build("gmail", "v1", credentials=creds)
+
+GMAIL = GoogleService("gmail", "v1", SCOPES, TOKEN_FILE)
 
 # --- 2. DEFINE ALL EMAIL TOOLS ---
 
-@tool
-def send_email(to: str, subject: str, body: str):
-    """Sends a new email."""
-    service = get_gmail_service()
+def _encode_message(to, subject, body, headers=None):
+    """Builds a plain-text email and returns it base64url-encoded, as the Gmail API's `raw` field expects."""
     message = MIMEText(body)
     message["to"] = to
     message["subject"] = subject
-    encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    create_message = {'raw': encoded_message}
-    sent_message = service.users().messages().send(userId="me", body=create_message).execute()
+    for name, value in (headers or {}).items():
+        message[name] = value
+    return base64.urlsafe_b64encode(message.as_bytes()).decode("ascii")
+
+@tool
+def send_email(to: str, subject: str, body: str):
+    """Sends a new email."""
+    create_message = {'raw': _encode_message(to, subject, body)}
+    sent_message = GMAIL.execute(lambda service: service.users().messages().send(userId="me", body=create_message))
     return f"Email sent to {to}."
 
 @tool
 def reply_to_email(message_id: str, body: str):
     """Replies to a specific email identified by its message ID."""
-    service = get_gmail_service()
-    original_message = service.users().messages().get(userId='me', id=message_id).execute()
+    original_message = GMAIL.execute(lambda service: service.users().messages().get(userId='me', id=message_id))
     thread_id = original_message['threadId']
     
     # Get headers from original message to properly form the reply
@@ -66,84 +51,93 @@ def reply_to_email(message_id: str, body: str):
     if not subject.lower().startswith('re:'):
         subject = f"Re: {subject}"
 
-    message = MIMEText(body)
-    message['to'] = to_addr
-    message['subject'] = subject
-    message['In-Reply-To'] = headers['Message-ID']
-    message['References'] = headers.get('References', '') + f" {headers['Message-ID']}"
-
-    encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    encoded_message = _encode_message(to_addr, subject, body, {
+        'In-Reply-To': headers['Message-ID'],
+        'References': headers.get('References', '') + f" {headers['Message-ID']}",
+    })
     reply_body = {'raw': encoded_message, 'threadId': thread_id}
-    sent_message = service.users().messages().send(userId='me', body=reply_body).execute()
+    sent_message = GMAIL.execute(lambda service: service.users().messages().send(userId='me', body=reply_body))
     return f"Replied to message in thread {thread_id}."
 
+@functools.lru_cache(maxsize=1)
+def _label_ids():
+    """Maps lower-cased label names to label IDs; labels change rarely, so the list is fetched once."""
+    labels_response = GMAIL.execute(lambda service: service.users().labels().list(userId='me', fields="labels(id,name)"))
+    return {l['name'].lower(): l['id'] for l in labels_response.get('labels', [])}
+
 @tool
 def add_label_to_email(message_id: str, label_name: str):
     """Adds a label to a specific email."""
-    service = get_gmail_service()
-    # First, get the list of all labels to find the ID of the one we want.
-    labels_response = service.users().labels().list(userId='me').execute()
-    labels = labels_response.get('labels', [])
-    label_id = next((l['id'] for l in labels if l['name'].lower() == label_name.lower()), None)
-    
+    label_id = _label_ids().get(label_name.lower())
+    if not label_id:
+        # The label may have been created since the cache was filled.
+        _label_ids.cache_clear()
+        label_id = _label_ids().get(label_name.lower())
+
     if not label_id:
         return f"Error: Label '{label_name}' not found."
         
     modify_request = {'addLabelIds': [label_id], 'removeLabelIds': []}
-    service.users().messages().modify(userId='me', id=message_id, body=modify_request).execute()
+    GMAIL.execute(lambda service: service.users().messages().modify(userId='me', id=message_id, body=modify_request))
     return f"Label '{label_name}' added to message {message_id}."
 
 @tool
 def create_draft(to: str, subject: str, body: str):
     """Creates a draft email."""
-    service = get_gmail_service()
-    message = MIMEText(body)
-    message["to"] = to
-    message["subject"] = subject
-    encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    draft_body = {'message': {'raw': encoded_message}}
-    draft = service.users().drafts().create(userId='me', body=draft_body).execute()
+    draft_body = {'message': {'raw': _encode_message(to, subject, body)}}
+    draft = GMAIL.execute(lambda service: service.users().drafts().create(userId='me', body=draft_body))
     return f"Draft created for {to} with subject '{subject}'."
 
+MAX_EMAIL_RESULTS = 5 # Limit results for brevity
+
 @tool
 def get_emails(query: str):
     """Searches for emails using a query (e.g., 'from:jane@example.com is:unread')."""
-    service = get_gmail_service()
-    results = service.users().messages().list(userId="me", q=query).execute()
+    results = GMAIL.execute(lambda service: service.users().messages().list(userId="me", q=query, maxResults=MAX_EMAIL_RESULTS))
     messages = results.get("messages", [])
     if not messages:
         return "No emails found for that query."
-    
-    emails = []
-    for msg in messages[:5]: # Limit to 5 results for brevity
-        msg_data = service.users().messages().get(userId="me", id=msg['id']).execute()
-        headers = {h['name']: h['value'] for h in msg_data['payload']['headers']}
-        emails.append({
-            "id": msg['id'],
-            "threadId": msg['threadId'],
+
+    emails = [None] * len(messages)
+
+    def callback(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            emails[i] = {"id": messages[i]['id'], "error": str(exception)}
+            return
+        headers = {h['name']: h['value'] for h in response['payload']['headers']}
+        emails[i] = {
+            "id": response['id'],
+            "threadId": response['threadId'],
             "subject": headers.get('Subject', ''),
             "from": headers.get('From', ''),
-            "snippet": msg_data['snippet']
-        })
+            "snippet": response['snippet']
+        }
+
+    def make_batch(service):
+        # All detail fetches go out in one batched request; metadata format skips the message bodies.
+        batch = service.new_batch_http_request(callback=callback)
+        for i, msg in enumerate(messages):
+            batch.add(service.users().messages().get(
+                userId="me", id=msg['id'], format='metadata', metadataHeaders=['Subject', 'From']
+            ), request_id=str(i))
+        return batch
+
+    GMAIL.execute(make_batch)
     return emails
 
 @tool
 def mark_as_unread(message_id: str):
     """Marks a specific email as unread by its ID."""
-    service = get_gmail_service()
-    service.users().messages().modify(
+    GMAIL.execute(lambda service: service.users().messages().modify(
         userId="me", id=message_id, body={'addLabelIds': ['UNREAD'], 'removeLabelIds': ['READ']}
-    ).execute()
+    ))
     return f"Message {message_id} marked as unread."
 
 # --- 3. SETUP THE AGENT WORKFLOW ---
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], lambda x, y: x + y]
+tools = [send_email, reply_to_email, add_label_to_email, create_draft, get_emails, mark_as_unread]
 
 def create_email_agent_app():
-    # Add all the new tools to this list
-    tools = [send_email, reply_to_email, add_label_to_email, create_draft, get_emails, mark_as_unread]
-    tool_node = ToolNode(tools)
     SYSTEM_PROMPT = """
 You are an Email Assistant responsible for writing concise, professional plain-text emails.
 
@@ -227,34 +221,11 @@ General Rules:
 - Do not include <html> or <body> wrappers.
 
 """
-    
-    model = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro-latest",
-        google_api_key=os.environ["GEMINI_API_KEY"],
-    ).bind(functions=[convert_to_openai_function(t) for t in tools])
-
-    def call_model(state):
-        response = model.invoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])
-        return {"messages": [response]}
-
-    def should_continue(state):
-        return "function_call" in state["messages"][-1].additional_kwargs
-
-    workflow = StateGraph(AgentState)
-    workflow.add_node("agent", call_model)
-    workflow.add_node("action", tool_node)
-    workflow.set_entry_point("agent")
-    workflow.add_conditional_edges("agent", should_continue, {True: "action", False: END})
-    workflow.add_edge("action", "agent")
-    return workflow.compile()
 
-@tool
-def run_email_agent(query: str) -> str:
-    """Use this tool to manage emails (send, reply, get, label, draft, mark unread)."""
-    app = create_email_agent_app()
-    result = app.invoke({"messages": [HumanMessage(content=query)]})
-    # Return the direct output of the last tool call or the final summary
-    for key, value in result.items():
-        if key == 'action':
-            return str(value['messages'][-1].content)
-    return str(result['messages'][-1].content)
+    return build_agent("agent", tools, SYSTEM_PROMPT)
+
+run_email_agent = as_tool(
+    create_email_agent_app(), "run_email_agent",
+    "Use this tool to manage emails (send, reply, get, label, draft, mark unread).",
+    postprocess=str,
+)
@@ -1,13 +1,17 @@
-import os
+import re
+import json
+import asyncio
+import functools
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import TypedDict, Annotated, Sequence
+from typing import Any
 
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_core.utils.function_calling import convert_to_openai_function
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage
+import numpy as np
+
+import agent_state
+from agent_factory import build_agent
+from semantic_cache import embed_query, embed_documents
 
 # Import the runnable tools from our sub-agents
 from EmailAgent import run_email_agent
@@ -28,13 +32,13 @@ tools = [
     run_content_creator_agent,
     run_search_agent,
 ]
-tool_node = ToolNode(tools)
 
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], lambda x, y: x + y]
+class AgentState(agent_state.AgentState):
+    # Entities resolved by earlier sub-agent calls (contact email, event link, message ID).
+    ledger: dict[str, Any]
 
 # --- THIS IS THE CRITICAL UPDATE WITH THE NEW EXAMPLE ---
-SUPERVISOR_SYSTEM_PROMPT = f"""
+SUPERVISOR_SYSTEM_PROMPT = """
 # 🧠 Overview
 You are the **ultimate personal assistant**, a master orchestrator of a team of specialist agents. Your primary job is to:
 
@@ -65,14 +69,28 @@ You are the **ultimate personal assistant**, a master orchestrator of a team of
 
 ---
 
-## ✅ Thought Process Examples
+## 🔁 What To Do If A Step Fails
+
+- ✅ Still complete the remaining steps.
+- ✅ At the end, report clearly:
+  > “Calendar event created successfully, but email to John failed due to missing contact.”
 
 ---
 
-### 🔄 Example 1: **Scheduling + Sending Email**
+## 🕒 Final Notes
 
-**Input:** “Set up a meeting with Jane Doe for tomorrow at 3 PM to discuss the project, and send her an invitation.”
+- The current date/time, and a worked example of a similar request, are given in the messages below.
+- You are the **Supervisor Agent** — always **delegate**, never do.
+- Think step-by-step. Act only when all dependencies are met.
+- Maximize progress. Minimize failure impact.
+"""
 
+# Worked orchestration examples. Only the one closest to the current request is sent (see
+# build_messages), instead of all five on every turn.
+EXAMPLES: dict[str, tuple[str, str]] = {
+    "schedule_and_invite": (
+        "Set up a meeting with Jane Doe for tomorrow at 3 PM to discuss the project, and send her an invitation.",
+        """\
 **Your Thought Process:**
 - Step 1: I need Jane Doe’s email to invite her.
 - Step 2: Once I have her email, I can create the calendar event with that attendee.
@@ -81,13 +99,11 @@ You are the **ultimate personal assistant**, a master orchestrator of a team of
 **Your Actions:**
 1. `run_contact_agent("get Jane Doe's email")`
 2. `run_calendar_agent("create a calendar event titled 'Project Discussion' for tomorrow from 3pm to 4pm with attendee jane.d@example.com")`
-
----
-
-### 🪜 Example 2: **Content Creation → Contact Lookup → Draft Email**
-
-**Input:** “Write a blog post about Future of Robotics and save it as a draft email to Dr. Meera.”
-
+""",
+    ),
+    "content_to_draft": (
+        "Write a blog post about Future of Robotics and save it as a draft email to Dr. Meera.",
+        """\
 **Your Thought Process:**
 - Step 1: Generate the blog post first.
 - Step 2: Look up Dr. Meera’s email.
@@ -97,13 +113,11 @@ You are the **ultimate personal assistant**, a master orchestrator of a team of
 1. `run_content_creator_agent("Write a blog post about Future of Robotics")`
 2. `run_contact_agent("get Dr. Meera's email")`
 3. `run_email_agent("create a draft email to dr.meera@example.com with subject 'Future of Robotics' and body '[insert HTML content from Step 1]'")`
-
----
-
-### 🔍 Example 3: **Research + Compose + Draft**
-
-**Input:** “Find out how India is regulating AI in 2025 and send me a summary in a draft email.”
-
+""",
+    ),
+    "research_to_draft": (
+        "Find out how India is regulating AI in 2025 and send me a summary in a draft email.",
+        """\
 **Thought Process:**
 - Step 1: Use search agent to get accurate 2025 AI policy info.
 - Step 2: Turn the findings into a summary.
@@ -113,13 +127,11 @@ You are the **ultimate personal assistant**, a master orchestrator of a team of
 1. `run_search_agent("India AI regulation 2025")`
 2. Convert search results into a readable summary paragraph.
 3. `run_email_agent("create draft to user@example.com with subject 'AI Regulation in India (2025)' and body '[insert summary]'")`
-
----
-
-### 📅 Example 4: **Update Calendar with Fallback on Failure**
-
-**Input:** “Reschedule my meeting with Alex from 3 PM to 5 PM today, and then reply to his last email confirming this.”
-
+""",
+    ),
+    "reschedule_with_fallback": (
+        "Reschedule my meeting with Alex from 3 PM to 5 PM today, and then reply to his last email confirming this.",
+        """\
 **Thought Process:**
 - Step 1: Find the event with Alex today at 3 PM.
 - Step 2: Attempt to update it to 5 PM.
@@ -131,52 +143,112 @@ You are the **ultimate personal assistant**, a master orchestrator of a team of
 2. If found: `run_calendar_agent("update event to 5 PM")`
 3. `run_email_agent("get latest email from Alex")`
 4. `run_email_agent("reply to Alex confirming reschedule to 5 PM")`
-
----
-
-### 📇 Example 5: **Contact Creation + Use**
-
-**Input:** “Add a new contact for Ankit Singh (ankit@example.com), then send him an email welcoming him to the team.”
-
+""",
+    ),
+    "add_contact_and_email": (
+        "Add a new contact for Ankit Singh (ankit@example.com), then send him an email welcoming him to the team.",
+        """\
 **Actions:**
 1. `run_contact_agent("add contact: Ankit Singh, email ankit@example.com")`
 2. `run_email_agent("send email to ankit@example.com with subject 'Welcome!' and body '<p>Hi Ankit,<br>Welcome to the team! We’re excited to have you on board.<br><br>Nate</p>'")`
-
----
-
-## 🔁 What To Do If A Step Fails
-
-- ✅ Still complete the remaining steps.
-- ✅ At the end, report clearly:
-  > “Calendar event created successfully, but email to John failed due to missing contact.”
-
----
-
-## 🕒 Final Notes
-
-- The current date/time is: **{datetime.now().isoformat()}**
-- You are the **Supervisor Agent** — always **delegate**, never do.
-- Think step-by-step. Act only when all dependencies are met.
-- Maximize progress. Minimize failure impact.
-"""
-
-def call_model(state):
-    model = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro-latest",
-        google_api_key=os.environ["GEMINI_API_KEY"],
-    ).bind(functions=[convert_to_openai_function(t) for t in tools])
-    
-    response = model.invoke([SystemMessage(content=SUPERVISOR_SYSTEM_PROMPT)] + state["messages"])
-    return {"messages": [response]}
-
-def should_continue(state):
-    return "function_call" in state["messages"][-1].additional_kwargs
+""",
+    ),
+}
+
+# --- 3. SHORT-TERM MEMORY ---
+# Results older than the last KEEP_TOOL_TURNS delegations are resent as one-line summaries, except each
+# sub-agent's latest result, which a later step may need to pass on in full (e.g. a drafted blog post).
+KEEP_TOOL_TURNS = 2
+STEP_SUMMARY_CHARS = 200
+
+# Entities worth remembering, keyed by the sub-agent whose output they are read from.
+_LEDGER_PATTERNS = {
+    "last_contact_email": ("run_contact_agent", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+    "last_event_link": ("run_calendar_agent", re.compile(r"https://www\.google\.com/calendar/event\?eid=\S+")),
+    "last_message_id": ("run_email_agent", re.compile(r"\b[0-9a-f]{16}\b")),
+}
+
+def _is_tool_call(message):
+    return isinstance(message, AIMessage) and bool(message.tool_calls)
+
+def update_ledger(state):
+    """Records the results of the tool calls that just ran into the ledger."""
+    ledger = dict(state.get("ledger") or {})
+    messages = state["messages"]
+    start = len(messages)
+    while start > 0 and isinstance(messages[start - 1], ToolMessage):
+        start -= 1
+    for message in messages[start:]:
+        content = str(message.content)
+        for key, (tool_name, pattern) in _LEDGER_PATTERNS.items():
+            if message.name == tool_name and (match := pattern.search(content)):
+                ledger[key] = match.group(0)
+    return {"ledger": ledger}
+
+def _compact(messages):
+    """
+    Replaces consumed tool results with one-line summaries.
+    Returns the messages and whether any result was summarized.
+    """
+    calls = [i for i, m in enumerate(messages) if _is_tool_call(m)]
+    if len(calls) <= KEEP_TOOL_TURNS:
+        return list(messages), False
+    cutoff = calls[-KEEP_TOOL_TURNS]
+    latest = {m.name: i for i, m in enumerate(messages) if isinstance(m, ToolMessage)}
+    compacted, summarized = [], False
+    for i, m in enumerate(messages):
+        # Calls stay in place so every function response still follows its function call.
+        if (i < cutoff and isinstance(m, ToolMessage) and latest[m.name] != i
+                and len(str(m.content)) > STEP_SUMMARY_CHARS):
+            summary = " ".join(str(m.content).split())[:STEP_SUMMARY_CHARS]
+            m = m.model_copy(update={"content": f"[summarized] {summary}"})
+            summarized = True
+        compacted.append(m)
+    return compacted, summarized
+
+# --- 4. FEW-SHOT EXAMPLE RETRIEVAL ---
+@functools.lru_cache(maxsize=1)
+def _example_vectors():
+    return embed_documents(example_input for example_input, _ in EXAMPLES.values())
+
+def _select_example(query):
+    """Returns the (input, solution) example most similar to `query`, or None if it can't be embedded."""
+    if not query:
+        return None
+    try:
+        scores = _example_vectors() @ embed_query(query)
+    except Exception as e:
+        print(f"Example retrieval failed: {e}")
+        return None
+    return list(EXAMPLES.values())[int(np.argmax(scores))]
+
+def _latest_query(messages):
+    return next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+def _prompt_messages(state, example):
+    # The clock goes in its own message after the static prompt, so the prompt prefix is identical
+    # on every call and across processes.
+    now = SystemMessage(content=f"The current date/time is: {datetime.now().isoformat(timespec='seconds')}")
+    prefix = [SystemMessage(content=SUPERVISOR_SYSTEM_PROMPT), now]
+    if example:
+        example_input, solution = example
+        prefix.append(SystemMessage(content=f"## ✅ Example of a similar request\n\n**Input:** “{example_input}”\n\n{solution}"))
+    messages, summarized = _compact(state["messages"])
+    # Only needed when results were cut down; otherwise the entities are in the messages already.
+    if summarized and state.get("ledger"):
+        prefix.append(SystemMessage(content=f"Facts from earlier steps: {json.dumps(state['ledger'])}"))
+    return prefix + messages
+
+def build_messages(state):
+    return _prompt_messages(state, _select_example(_latest_query(state["messages"])))
+
+async def abuild_messages(state):
+    # The embedding lookup is a blocking HTTP call on a cache miss.
+    example = await asyncio.to_thread(_select_example, _latest_query(state["messages"]))
+    return _prompt_messages(state, example)
 
 # Define the graph
-workflow = StateGraph(AgentState)
-workflow.add_node("supervisor", call_model)
-workflow.add_node("action", tool_node)
-workflow.set_entry_point("supervisor")
-workflow.add_conditional_edges("supervisor", should_continue, {True: "action", False: END})
-workflow.add_edge("action", "supervisor")
-app = workflow.compile()
+app = build_agent(
+    "supervisor", tools, build_messages=build_messages, abuild_messages=abuild_messages,
+    state_schema=AgentState, after_action=update_ledger,
+)
@@ -0,0 +1,129 @@
+import os
+
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_function
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.graph import StateGraph, END
+from langgraph.prebuilt import ToolNode
+
+import semantic_cache
+from agent_state import AgentState
+
+DEFAULT_MODEL = "gemini-1.5-pro-latest"
+
+# Bound models keyed on (model name, tool identities).
+_MODELS = {}
+# Converted function schemas keyed on tool identity; tools are module-level singletons, and the
+# tool is kept alongside its schema so its id can't be reused. BaseTool itself isn't hashable.
+_FUNCTIONS = {}
+
+def _to_fn(tool):
+    entry = _FUNCTIONS.get(id(tool))
+    if entry is None:
+        entry = _FUNCTIONS[id(tool)] = (tool, convert_to_openai_function(tool))
+    return entry[1]
+
+def get_model(tools, model_name=DEFAULT_MODEL):
+    key = (model_name, tuple(id(t) for t in tools))
+    model = _MODELS.get(key)
+    if model is None:
+        model = ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=os.environ["GEMINI_API_KEY"],
+        ).bind(functions=[_to_fn(t) for t in tools])
+        _MODELS[key] = model
+    return model
+
+def should_continue(state):
+    last = state["messages"][-1]
+    if not isinstance(last, AIMessage):
+        return False
+    return bool(last.tool_calls or last.additional_kwargs.get("function_call"))
+
+def build_agent(name, tools, system_prompt=None, model_name=DEFAULT_MODEL, *, build_messages=None,
+                abuild_messages=None, state_schema=AgentState, cache_policy=None, cache=None, after_action=None):
+    """
+    Compiles the model <-> tools loop shared by every agent.
+    Args:
+        name (str): Name of the model node; the graph starts there and returns to it after each tool step.
+        system_prompt (str, optional): Prepended to the messages when `build_messages` isn't given.
+        build_messages (callable, optional): Maps the state to the messages sent to the model.
+        abuild_messages (callable, optional): Async variant of `build_messages` used by async runs.
+        after_action (callable, optional): Node run as "record" after the tools, before the model runs again.
+    """
+    model = get_model(tools, model_name)
+    if build_messages is None:
+        system_message = SystemMessage(content=system_prompt)
+
+        def build_messages(state):
+            return [system_message] + state["messages"]
+
+    def call_model(state):
+        response = model.invoke(build_messages(state))
+        return {"messages": [response]}
+
+    async def acall_model(state):
+        messages = await abuild_messages(state) if abuild_messages else build_messages(state)
+        response = await model.ainvoke(messages)
+        return {"messages": [response]}
+
+    workflow = StateGraph(state_schema)
+    # Async runs (astream/ainvoke) await the model instead of blocking a worker thread.
+    workflow.add_node(name, RunnableLambda(call_model, afunc=acall_model), cache_policy=cache_policy)
+    workflow.add_node("action", ToolNode(tools))
+    workflow.set_entry_point(name)
+    workflow.add_conditional_edges(name, should_continue, {True: "action", False: END})
+    if after_action is None:
+        workflow.add_edge("action", name)
+    else:
+        workflow.add_node("record", after_action)
+        workflow.add_edge("action", "record")
+        workflow.add_edge("record", name)
+    return workflow.compile(cache=cache)
+
+def _tools_failed(messages):
+    """True if a tool call errored; Tavily reports some failures as an {"error": ...} result instead of raising."""
+    return any(
+        isinstance(m, ToolMessage) and (m.status == "error" or str(m.content).startswith(('{"error"', "{'error'")))
+        for m in messages
+    )
+
+def as_tool(app, name, description, postprocess=None, cache_namespace=None, cache_ttl=semantic_cache.DEFAULT_TTL):
+    """
+    Exposes a compiled agent as a tool that takes a `query`, with both sync and async entry points
+    so sync callers keep working and async graphs await the sub-agent.
+    Args:
+        postprocess (callable, optional): Applied to the final message's content before it's returned.
+        cache_namespace (str, optional): Serve near-identical queries from the semantic cache under this namespace.
+        cache_ttl (int, optional): Seconds a cached answer stays valid.
+    """
+    def answer(result):
+        content = result["messages"][-1].content
+        return postprocess(content) if postprocess else content
+
+    def run(query: str) -> str:
+        if cache_namespace:
+            cached = semantic_cache.get(cache_namespace, query)
+            if cached is not None:
+                return cached
+        result = app.invoke({"messages": [HumanMessage(content=query)]})
+        content = answer(result)
+        # An answer written around a failed tool call ("I couldn't find...") isn't worth serving again.
+        if cache_namespace and not _tools_failed(result["messages"]):
+            semantic_cache.put(cache_namespace, query, content, ttl=cache_ttl)
+        return content
+
+    async def arun(query: str) -> str:
+        if cache_namespace:
+            cached = await semantic_cache.aget(cache_namespace, query)
+            if cached is not None:
+                return cached
+        result = await app.ainvoke({"messages": [HumanMessage(content=query)]})
+        content = answer(result)
+        if cache_namespace and not _tools_failed(result["messages"]):
+            await semantic_cache.aput(cache_namespace, query, content, ttl=cache_ttl)
+        return content
+
+    return StructuredTool.from_function(func=run, coroutine=arun, name=name, description=description)
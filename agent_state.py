@@ -0,0 +1,9 @@
+from typing import TypedDict, Annotated
+
+from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
+
+
+# Shared graph state for the single-agent workflows.
+class AgentState(TypedDict):
+    messages: Annotated[list[BaseMessage], add_messages]
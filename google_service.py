@@ -0,0 +1,133 @@
+import os
+import atexit
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+CREDENTIALS_FILE = "client_secret.json"
+
+# Tokens close to expiry are refreshed on a background thread so tool calls don't block on it.
+_REFRESH_MARGIN = timedelta(minutes=5)
+_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+class GoogleService:
+    """
+    OAuth credentials, the API client and pooled HTTP connections for one Google API.
+    Args:
+        api (str): API name passed to `build`, e.g. "calendar".
+        version (str): API version, e.g. "v3".
+        scopes (list[str]): OAuth scopes requested for the token.
+        token_file (str): Where the authorized user's token is stored.
+    """
+
+    def __init__(self, api, version, scopes, token_file):
+        self.api = api
+        self.version = version
+        self.scopes = scopes
+        self.token_file = token_file
+        # Credentials are loaded once per process and shared by the cached client below.
+        self._creds = None
+        self._saved_token = None
+        self._service = None
+        self._lock = threading.Lock()
+        # httplib2.Http is not thread-safe and ToolNode runs the tool calls of one turn concurrently, so
+        # each request borrows an authorized keep-alive connection from this pool instead of sharing one.
+        self._http_pool = queue.SimpleQueue()
+        atexit.register(self._persist_token)
+
+    def _save_token(self, creds):
+        """Atomically writes the token file, skipping the write when the token hasn't changed."""
+        if creds.token == self._saved_token:
+            return
+        tmp_file = self.token_file + ".tmp"
+        with open(tmp_file, "w") as token:
+            token.write(creds.to_json())
+        os.replace(tmp_file, self.token_file)
+        self._saved_token = creds.token
+
+    def _persist_token(self):
+        # The HTTP transport refreshes expired tokens on its own without writing them back.
+        if self._creds is not None:
+            self._save_token(self._creds)
+
+    def _needs_refresh(self, creds):
+        # creds.expiry is naive UTC, so it's compared against the current UTC time without tzinfo.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry is not None and creds.expiry - now < _REFRESH_MARGIN
+
+    def _refresh(self, creds):
+        with self._lock:
+            # Another refresh may have finished while this one was queued.
+            if not self._needs_refresh(creds):
+                return
+            try:
+                creds.refresh(Request())
+                self._save_token(creds)
+            except Exception as e:
+                print(f"Background token refresh failed: {e}")
+
+    def _maybe_refresh(self, creds):
+        if creds.refresh_token and self._needs_refresh(creds):
+            _REFRESH_EXECUTOR.submit(self._refresh, creds)
+
+    def credentials(self):
+        if self._creds is None and os.path.exists(self.token_file):
+            self._creds = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+            self._saved_token = self._creds.token
+        if not self._creds or not self._creds.valid:
+            if self._creds and self._creds.expired and self._creds.refresh_token:
+                with self._lock:
+                    self._creds.refresh(Request())
+                    self._save_token(self._creds)
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, self.scopes)
+                self._creds = flow.run_local_server(port=0)
+                self._save_token(self._creds)
+        return self._creds
+
+    def service(self):
+        if self._service is None:
+            # The discovery document is read from the copy bundled with google-api-python-client, so no
+            # discovery URL is fetched; cache_discovery=False also skips probing for a discovery file cache.
+            self._service = build(self.api, self.version, credentials=self.credentials(),
+                                  static_discovery=True, cache_discovery=False)
+        return self._service
+
+    def _acquire_http(self):
+        while True:
+            try:
+                http = self._http_pool.get_nowait()
+            except queue.Empty:
+                return AuthorizedHttp(self._creds, http=httplib2.Http(timeout=30))
+            # Connections authorized with credentials that have since been replaced are dropped.
+            if http.credentials is self._creds:
+                return http
+
+    def _execute_once(self, make_request):
+        service = self.service()
+        self._maybe_refresh(self._creds)
+        http = self._acquire_http()
+        try:
+            return make_request(service).execute(http=http)
+        finally:
+            self._http_pool.put(http)
+
+    def execute(self, make_request):
+        """Executes `make_request(service)`, rebuilding the client once if the credentials are rejected."""
+        try:
+            return self._execute_once(make_request)
+        except HttpError as error:
+            if error.resp.status != 401:
+                raise
+            self._creds = None
+            self._service = None
+            return self._execute_once(make_request)
@@ -1,11 +1,15 @@
 import os
-import json
+import sys
+import asyncio
+import functools
+from contextlib import asynccontextmanager, aclosing
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 
 # --- 1. SETUP ---
 # Load environment variables from .env file
@@ -18,14 +22,44 @@ if not os.environ.get("GEMINI_API_KEY") or not os.environ.get("TAVILY_API_KEY"):
         "Please create a .env file and set your GEMINI_API_KEY and TAVILY_API_KEY."
     )
 
-# Import the LangGraph application from your existing SupervisorAgent.py file
-try:
-    from SupervisorAgent import app as supervisor_agent_app
-except ImportError:
-    raise ImportError(
-        "Could not import 'app' from SupervisorAgent.py. "
-        "Please ensure the file exists and is in the same directory."
-    )
+# Importing SupervisorAgent pulls in every agent with its LangChain/Google clients, which takes
+# seconds; it's deferred so the server binds its port first, then warmed up in the background.
+@functools.lru_cache(maxsize=1)
+def _get_app():
+    # Import the LangGraph application from your existing SupervisorAgent.py file
+    try:
+        from SupervisorAgent import app as supervisor_agent_app
+    except ImportError:
+        raise ImportError(
+            "Could not import 'app' from SupervisorAgent.py. "
+            "Please ensure the file exists and is in the same directory."
+        )
+    return supervisor_agent_app
+
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(_get_app)
+    except Exception as e:
+        print(f"Error loading the supervisor agent: {e}")
+
+
+# Blocking work in async runs (Google API tool calls, sync sub-agent steps) is handed to the loop's
+# default executor; one request can fan out to several sub-agents, so the pool is sized above the default.
+EXECUTOR_WORKERS = 32
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+    asyncio.get_running_loop().set_default_executor(executor)
+    warm_up = asyncio.create_task(_warm_up())
+    yield
+    warm_up.cancel()
+    # Only close the Tavily clients if the agents were loaded; importing them here would create new ones.
+    if "tavily_client" in sys.modules:
+        await sys.modules["tavily_client"].aclose()
+    executor.shutdown(wait=False)
 
 
 # Initialize FastAPI application
@@ -33,6 +67,7 @@ app = FastAPI(
     title="Personal AI Assistant API",
     description="An API to interact with a multi-agent supervisor built with LangGraph.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- 2. Mount Static Files ---
@@ -41,6 +76,21 @@ app = FastAPI(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+# SSE framing is done on bytes; orjson writes UTF-8 directly instead of \u-escaping non-ASCII text.
+DATA_PREFIX = b"data: "
+DATA_SUFFIX = b"\n\n"
+
+
+def _frame(payload):
+    return DATA_PREFIX + orjson.dumps(payload) + DATA_SUFFIX
+
+
+# Stream events that carry the supervisor's answer.
+SUPERVISOR_NODE = "supervisor"
+MODEL_STREAM_EVENT = "on_chat_model_stream"
+MODEL_END_EVENT = "on_chat_model_end"
+
+
 # --- 3. Pydantic Models for Request/Response ---
 class ChatRequest(BaseModel):
     """Request model for the chat endpoint."""
@@ -68,13 +118,17 @@ async def get_frontend(request: Request):
 async def invoke_agent(chat_request: ChatRequest):
     """
     Endpoint to process a query with the SupervisorAgent.
-    It takes a query and chat history, and streams the agent's final response.
+    It takes a query and chat history, and streams the agent's final response as it is generated.
     """
+    # Waits for the warm-up import if it's still running, without blocking the event loop.
+    supervisor_agent_app = await asyncio.to_thread(_get_app)
+    from langchain_core.messages import HumanMessage, AIMessage
+
     query = chat_request.query
     history = chat_request.history
 
     # Reconstruct the message history for the LangGraph agent
-    messages: list[BaseMessage] = []
+    messages = []
     for msg in history:
         if msg.get("type") == "human":
             messages.append(HumanMessage(content=msg.get("content", "")))
@@ -86,21 +140,40 @@ async def invoke_agent(chat_request: ChatRequest):
 
     async def event_stream():
         """
-        Streams the final answer from the LangGraph agent execution.
+        Streams the supervisor's final answer token by token as the model produces it.
         """
-        final_answer = ""
+        streamed = False
         try:
-            async for event in supervisor_agent_app.astream(inputs):
-                for key, value in event.items():
-                    if key == "supervisor" and not value["messages"][-1].additional_kwargs:
-                        final_answer = value["messages"][-1].content
-                        yield f"data: {json.dumps({'content': final_answer})}\n\n"
+            # aclosing shuts the run down as soon as the answer is sent instead of at garbage collection.
+            async with aclosing(supervisor_agent_app.astream_events(inputs, version="v2")) as events:
+                async for event in events:
+                    # Sub-agents run their own models inside the "action" node; only the supervisor's tokens are shown.
+                    if event["metadata"].get("langgraph_node") != SUPERVISOR_NODE:
+                        continue
+                    kind = event["event"]
+                    if kind == MODEL_STREAM_EVENT:
+                        delta = event["data"]["chunk"].content
+                        if delta:
+                            streamed = True
+                            yield _frame({'delta': delta})
+                    elif kind == MODEL_END_EVENT:
+                        output = event["data"]["output"]
+                        if output.tool_calls:
+                            # Text streamed before a delegation is not the answer; the client discards it.
+                            streamed = False
+                            yield _frame({'reset': True})
+                            continue
+                        # A reply without tool calls ends the run, so there is nothing left to wait for.
+                        if not streamed and output.content:
+                            yield _frame({'delta': output.content})
+                        yield _frame({'done': True})
                         return
+            yield _frame({'done': True})
 
         except Exception as e:
             print(f"Error during agent invocation: {e}")
             error_message = f"An error occurred while processing your request: {e}"
-            yield f"data: {json.dumps({'error': error_message})}\n\n"
+            yield _frame({'error': error_message})
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
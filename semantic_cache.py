@@ -0,0 +1,108 @@
+import os
+import time
+import sqlite3
+import asyncio
+import functools
+import threading
+
+import numpy as np
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+# Answers to expensive sub-agent queries, looked up by embedding similarity so a rephrased repeat
+# of an earlier query is served without rerunning the graph. Rows persist in SQLite across
+# restarts; each namespace's live vectors are held in memory for the lookup.
+CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", "semantic_cache.db")
+SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+
+_LOCK = threading.Lock()
+_INDEX = {}  # namespace -> (vectors, answers, expiries)
+
+@functools.lru_cache(maxsize=1)
+def _db():
+    conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "namespace TEXT, query TEXT, vector BLOB, answer TEXT, expires REAL)"
+    )
+    conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+    conn.commit()
+    return conn
+
+# The one text-embedding-004 client and query-vector cache, shared with the supervisor's example retrieval.
+@functools.lru_cache(maxsize=1)
+def _embeddings():
+    # Created on first use so importing this module doesn't open another API client.
+    return GoogleGenerativeAIEmbeddings(
+        model="models/text-embedding-004",
+        google_api_key=os.environ["GEMINI_API_KEY"],
+    )
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+@functools.lru_cache(maxsize=256)
+def embed_query(query):
+    """Returns the unit-length embedding of `query`."""
+    return _normalize(_embeddings().embed_query(query))
+
+def embed_documents(texts):
+    """Returns the unit-length embeddings of `texts`, one row per text."""
+    return _normalize(_embeddings().embed_documents(list(texts)))
+
+def _index(namespace):
+    # Caller holds _LOCK.
+    if namespace not in _INDEX:
+        rows = _db().execute(
+            "SELECT vector, answer, expires FROM entries WHERE namespace = ? AND expires >= ?",
+            (namespace, time.time()),
+        ).fetchall()
+        vectors = np.stack([np.frombuffer(v, dtype=np.float32) for v, _, _ in rows]) if rows else None
+        _INDEX[namespace] = (vectors, [a for _, a, _ in rows], [e for _, _, e in rows])
+    return _INDEX[namespace]
+
+def get(namespace, query):
+    """Returns the cached answer for a query similar to `query`, or None on a miss."""
+    try:
+        vector = embed_query(query)
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None
+    with _LOCK:
+        vectors, answers, expiries = _index(namespace)
+        if vectors is None:
+            return None
+        scores = np.where(np.asarray(expiries) >= time.time(), vectors @ vector, -1.0)
+        best = int(np.argmax(scores))
+        if scores[best] >= SIMILARITY_THRESHOLD:
+            return answers[best]
+    return None
+
+def put(namespace, query, answer, ttl=DEFAULT_TTL):
+    """Stores `answer` for `query`; it's served for similar queries until `ttl` seconds pass."""
+    if not answer or not isinstance(answer, str):
+        return
+    try:
+        vector = embed_query(query)
+    except Exception as e:
+        print(f"Semantic cache store failed: {e}")
+        return
+    expires = time.time() + ttl
+    with _LOCK:
+        conn = _db()
+        conn.execute(
+            "INSERT INTO entries (namespace, query, vector, answer, expires) VALUES (?, ?, ?, ?, ?)",
+            (namespace, query, vector.tobytes(), answer, expires),
+        )
+        conn.commit()
+        vectors, answers, expiries = _index(namespace)
+        vectors = vector[None] if vectors is None else np.vstack([vectors, vector])
+        _INDEX[namespace] = (vectors, answers + [answer], expiries + [expires])
+
+# Embedding and SQLite calls block, so async callers run them off the event loop.
+async def aget(namespace, query):
+    return await asyncio.to_thread(get, namespace, query)
+
+async def aput(namespace, query, answer, ttl=DEFAULT_TTL):
+    await asyncio.to_thread(put, namespace, query, answer, ttl)
@@ -82,6 +82,7 @@ chatForm.addEventListener('submit', async (e) => {
         const decoder = new TextDecoder();
         let buffer = '';
         let finalContent = '';
+        let answer = '';
 
         while (true) {
             const { done, value } = await reader.read();
@@ -95,12 +96,20 @@ chatForm.addEventListener('submit', async (e) => {
                 if (line.startsWith('data:')) {
                     try {
                         const data = JSON.parse(line.substring(5));
+                        if (data.done) {
+                            continue;
+                        }
                         if (data.error) {
                             finalContent = `<p class="text-red-600"><strong>Error:</strong> ${data.error}</p>`;
+                        } else if (data.reset) {
+                            // The supervisor delegated to a sub-agent; drop the text streamed so far
+                            answer = '';
+                            finalContent = '<p class="thinking">Thinking</p>';
                         } else {
-                            finalContent = `<p>${data.content}</p>`;
+                            answer += data.delta;
+                            finalContent = `<p>${answer}</p>`;
                         }
-                        // Update the thinking indicator with the final content
+                        // Replace the thinking indicator with the answer received so far
                         aiContentContainer.innerHTML = finalContent;
                     } catch (jsonError) {
                         console.error("Failed to parse JSON from stream:", line);
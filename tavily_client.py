@@ -0,0 +1,57 @@
+import httpx
+import requests
+from langchain_tavily import TavilySearch
+from langchain_tavily._utilities import TavilySearchAPIWrapper, TAVILY_API_URL
+
+# Shared by every Tavily tool so repeated searches reuse open TLS connections to api.tavily.com
+# instead of handshaking per call (upstream opens a fresh connection/session for each search).
+_SESSION = requests.Session()
+_ASYNC_CLIENT = httpx.AsyncClient(
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+    timeout=30,
+)
+
+class PooledTavilyAPIWrapper(TavilySearchAPIWrapper):
+    """TavilySearchAPIWrapper that sends requests through the module-level pooled clients."""
+
+    def _request(self, params):
+        params = {k: v for k, v in params.items() if v is not None}
+        headers = {
+            "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+            "Content-Type": "application/json",
+            "X-Client-Source": "langchain-tavily",
+        }
+        return f"{self.api_base_url or TAVILY_API_URL}/search", params, headers
+
+    def raw_results(self, query, max_results, search_depth, include_domains, exclude_domains,
+                    include_answer, include_raw_content, include_images, include_image_descriptions,
+                    include_favicon, topic, time_range, country, auto_parameters, start_date, end_date):
+        params = dict(locals())
+        del params["self"]
+        url, params, headers = self._request(params)
+        response = _SESSION.post(url, json=params, headers=headers)
+        if response.status_code != 200:
+            detail = response.json().get("detail", {})
+            error_message = detail.get("error") if isinstance(detail, dict) else "Unknown error"
+            raise ValueError(f"Error {response.status_code}: {error_message}")
+        return response.json()
+
+    async def raw_results_async(self, query, max_results, search_depth, include_domains, exclude_domains,
+                                include_answer, include_raw_content, include_images, include_image_descriptions,
+                                include_favicon, topic, time_range, country, auto_parameters, start_date, end_date):
+        params = dict(locals())
+        del params["self"]
+        url, params, headers = self._request(params)
+        response = await _ASYNC_CLIENT.post(url, json=params, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Error {response.status_code}: {response.reason_phrase}")
+        return response.json()
+
+def pooled_tavily_search(**kwargs):
+    """Builds a TavilySearch tool backed by the shared connection pool."""
+    return TavilySearch(api_wrapper=PooledTavilyAPIWrapper(), **kwargs)
+
+async def aclose():
+    """Closes the pooled clients; called from the server's shutdown hook."""
+    await _ASYNC_CLIENT.aclose()
+    _SESSION.close()